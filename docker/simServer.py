@@ -1,38 +1,63 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import os
+import signal
+import sys
+import time
 from datetime import datetime
 from simServerDepend import ServerConfig
-import json
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import parse_qs
+from functools import lru_cache
 import logging
-from logging.handlers import RotatingFileHandler
+import platform
 
-class CustomLogFormatter(logging.Formatter):
-    def format(self, record):
-        record.ip = getattr(record, 'ip', '-')
-        record.method = getattr(record, 'method', '-')
-        record.path = getattr(record, 'path', '-')
-        record.status = getattr(record, 'status', '-')
-        return super().format(record)
+# orjson 为可选加速依赖；PyPy 等无法安装 orjson 时回退到标准库 json，
+# 两种后端输出相同的紧凑格式
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    import json
+
+    def _dumps(data):
+        return json.dumps(data, separators=(',', ':')).encode()
+
+    JSON_BACKEND = 'json'
+
+@lru_cache(maxsize=256)
+def _query_json(query_string):
+    # 压测流量的查询串高度重复，缓存解析并序列化后的结果
+    return _dumps(parse_qs(query_string))
+
+# (秒, ISO 格式时间) 缓存，同一秒内的请求复用
+_ts_cache = (None, '')
+
+def _now_iso():
+    global _ts_cache
+    second = int(time.time())
+    cached = _ts_cache
+    if cached[0] != second:
+        cached = (second, datetime.fromtimestamp(second).isoformat())
+        _ts_cache = cached
+    return cached[1]
 
 class RequestHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.config = ServerConfig()
-        self._setup_logging()
-        super().__init__(*args, **kwargs)
-
-    def _setup_logging(self):
-        os.makedirs(os.path.dirname(self.config.log_file), exist_ok=True)
-        formatter = CustomLogFormatter(self.config.log_format)
-        handler = RotatingFileHandler(
-            self.config.log_file,
-            maxBytes=10*1024*1024,  # 10MB
-            backupCount=3
-        )
-        handler.setFormatter(formatter)
-        self.logger = logging.getLogger('simserver')
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging.INFO)
+    # 所有响应都带 Content-Length，可以使用 HTTP/1.1 长连接
+    protocol_version = 'HTTP/1.1'
+    # 空闲长连接的超时时间（秒），避免占用处理线程
+    timeout = 30
+    # 进程级共享配置，由 run_server 加载一次后绑定
+    config = None
+    # 预渲染的 HTML 模板，由 run_server 根据配置生成
+    HTML_PREFIX = b''
+    HTML_SUFFIX = b''
+    HEALTH_BODY = _dumps({'status': 'healthy'})
+    # /test 响应体的固定片段，version 部分由 run_server 根据配置生成
+    TEST_PREFIX = b'{"status":"success","query":'
+    TEST_MIDDLE = b',"version":null,"timestamp":"'
+    TEST_SUFFIX = b'"}'
+    logger = logging.getLogger('simserver')
 
     def log_request_to_file(self, status=200):
         extra = {
@@ -43,58 +68,91 @@ class RequestHandler(BaseHTTPRequestHandler):
         }
         self.logger.info('Request processed', extra=extra)
 
+    def _send_raw(self, status, content_type, body):
+        # 状态行、响应头和响应体拼成一个 bytes，一次 write 发出
+        self.log_request(status)
+        head = (
+            f"{self.protocol_version} {status} {self.responses[status][0]}\r\n"
+            f"Server: {self.version_string()}\r\n"
+            f"Date: {self.date_time_string()}\r\n"
+            f"Content-type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        )
+        self.wfile.write(head.encode('latin-1') + body)
+
     def send_json_response(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self._send_raw(status, 'application/json', _dumps(data))
+
+    def _handle_test(self, query_string):
+        # 测试端点，返回请求信息；直接拼接预先序列化的 JSON 片段
+        body = (
+            self.TEST_PREFIX + _query_json(query_string) + self.TEST_MIDDLE
+            + _now_iso().encode('ascii') + self.TEST_SUFFIX
+        )
+        self._send_raw(200, 'application/json', body)
+        self.log_request_to_file()
+
+    def _handle_health(self, query_string):
+        # 健康检查端点，响应体固定，默认不写入请求日志
+        self._send_raw(200, 'application/json', self.HEALTH_BODY)
+        if self.config.log_health:
+            self.log_request_to_file()
+
+    def _handle_default(self, query_string):
+        # 默认 HTML 响应，仅在请求时拼接服务器时间
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S').encode('ascii')
+        self._send_raw(200, 'text/html', self.HTML_PREFIX + timestamp + self.HTML_SUFFIX)
+        self.log_request_to_file()
+
+    # 路由表：路径 -> 处理方法名，未命中的路径走 _handle_default
+    ROUTES = {
+        '/test': '_handle_test',
+        '/health': '_handle_health',
+    }
 
     def do_GET(self):
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        query = parse_qs(parsed_path.query)
-        
-        if path == '/test':
-            # 测试端点，返回请求信息
-            response_data = {
-                'status': 'success',
-                'query': query,
-                'version': self.config.version,
-                'timestamp': datetime.now().isoformat()
-            }
-            self.send_json_response(response_data)
-        elif path == '/health':
-            # 健康检查端点
-            self.send_json_response({'status': 'healthy'})
+        raw = self.path
+        q = raw.find('?')
+        if q < 0:
+            path, query_string = raw, ''
         else:
-            # 默认 HTML 响应
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
-            html_content = f"""
+            path, query_string = raw[:q], raw[q + 1:]
+        getattr(self, self.ROUTES.get(path, '_handle_default'))(query_string)
+
+def render_html_template(config):
+    """预渲染默认 HTML 页面，返回时间戳前后两段 bytes"""
+    prefix = f"""
             <html>
                 <head>
-                    <title>Simple Server v{self.config.version}</title>
+                    <title>Simple Server v{config.version}</title>
                 </head>
                 <body>
-                    <h1>{self.config.welcome_message}</h1>
-                    <p>This is a simple HTTP server (v{self.config.version}).</p>
-                    <p>Server Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+                    <h1>{config.welcome_message}</h1>
+                    <p>This is a simple HTTP server (v{config.version}).</p>
+                    <p>Server Time: """
+    suffix = """</p>
                 </body>
             </html>
             """
-            self.wfile.write(html_content.encode())
-        
-        self.log_request_to_file()
+    return prefix.encode(), suffix.encode()
 
 def run_server():
     print("Starting server...")
     cwd = os.getcwd()
     print("Current working directory: ", cwd)
+    print(f"Python runtime: {platform.python_implementation()} {platform.python_version()}, JSON backend: {JSON_BACKEND}")
     config = ServerConfig()
+    RequestHandler.config = config
+    config.setup_logging()
+    # docker stop 发送 SIGTERM，转为正常退出以便 atexit 刷新日志队列
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    prefix, suffix = render_html_template(config)
+    RequestHandler.HTML_PREFIX = prefix
+    RequestHandler.HTML_SUFFIX = suffix
+    RequestHandler.TEST_MIDDLE = b',"version":' + _dumps(config.version) + b',"timestamp":"'
     server_address = ('', config.port)
-    httpd = HTTPServer(server_address, RequestHandler)
+    httpd = ThreadingHTTPServer(server_address, RequestHandler)
     print(f"Server running on port {config.port}...")
     httpd.serve_forever()
 
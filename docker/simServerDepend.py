@@ -1,12 +1,55 @@
+import atexit
 import configparser
 import os
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import time
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
+class CustomLogFormatter(logging.Formatter):
+    # (秒, 格式化后的时间) 缓存，整体替换以保证多线程下读取一致
+    _time_cache = (None, '')
+
+    def format(self, record):
+        record.ip = getattr(record, 'ip', '-')
+        record.method = getattr(record, 'method', '-')
+        record.path = getattr(record, 'path', '-')
+        record.status = getattr(record, 'status', '-')
+        return super().format(record)
+
+    def formatTime(self, record, datefmt=None):
+        if datefmt or self.datefmt:
+            return super().formatTime(record, datefmt)
+        # 同一秒内的日志复用已格式化的时间，只拼接毫秒部分
+        second = int(record.created)
+        cached = self._time_cache
+        if cached[0] != second:
+            cached = (second, time.strftime(self.default_time_format, self.converter(record.created)))
+            self._time_cache = cached
+        return self.default_msec_format % (cached[1], record.msecs)
+
 class ServerConfig:
+    # 配置在加载时展开为普通属性，之后不再访问 ConfigParser
+    __slots__ = (
+        'port', 'welcome_message', 'version',
+        'log_format', 'log_file', 'log_health', 'log_rotate',
+        'log_max_files', 'log_level', '_max_bytes',
+    )
+
     def __init__(self, config_path='./config/config.ini'):
-        self.config = self._load_config(config_path)
+        config = self._load_config(config_path)
+        self.port = config.getint('server', 'port')
+        self.welcome_message = config.get('server', 'welcome_message')
+        self.version = config.get('server', 'version')
+        self.log_format = config.get('logging', 'format')
+        self.log_file = config.get('logging', 'file')
+        self.log_health = config.getboolean('logging', 'log_health', fallback=False)
+        self.log_rotate = config.getboolean('logging', 'rotate')
+        self.log_max_files = config.getint('logging', 'max_files')
+        self.log_level = config.get('logging', 'level').upper()
+        self._max_bytes = self._parse_size(config.get('logging', 'max_size'))
     
     def _load_config(self, config_path):
         if not os.path.exists(config_path):
@@ -16,46 +59,38 @@ class ServerConfig:
         config.read(config_path)
         return config
     
-    def _setup_logging(self):
-        if self.config.getboolean('logging', 'rotate'):
+    def setup_logging(self):
+        # 进程启动时调用一次，重复调用不会再挂载 handler
+        logger = logging.getLogger('simserver')
+        if logger.handlers:
+            return
+
+        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        if self.log_rotate:
             handler = RotatingFileHandler(
                 self.log_file,
-                maxBytes=self._parse_size(self.config.get('logging', 'max_size')),
-                backupCount=self.config.getint('logging', 'max_files')
+                maxBytes=self._max_bytes,
+                backupCount=self.log_max_files
             )
         else:
-            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
             handler = logging.FileHandler(self.log_file)
 
-        formatter = logging.Formatter(self.config.get('logging', 'format'))
+        formatter = CustomLogFormatter(self.log_format)
         handler.setFormatter(formatter)
-        logger = logging.getLogger('simserver')
-        logger.addHandler(handler)
-        logger.setLevel(getattr(logging, self.config.get('logging', 'level').upper()))
 
-    def _parse_size(self, size_str):
+        # 请求线程只负责入队，由后台线程统一写文件，避免争用 handler 锁
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(QueueHandler(log_queue))
+        logger.setLevel(getattr(logging, self.log_level))
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _parse_size(size_str):
         units = {'K': 1024, 'M': 1024*1024, 'G': 1024*1024*1024}
         unit = size_str[-1].upper()
         if unit in units:
             return int(size_str[:-1]) * units[unit]
         return int(size_str)
-    
-    @property
-    def port(self):
-        return self.config.getint('server', 'port')
-    
-    @property
-    def welcome_message(self):
-        return self.config.get('server', 'welcome_message')
-    
-    @property
-    def version(self):
-        return self.config.get('server', 'version')
-    
-    @property
-    def log_format(self):
-        return self.config.get('logging', 'format')
-    
-    @property
-    def log_file(self):
-        return self.config.get('logging', 'file') 
\ No newline at end of file